@@ -13,9 +13,17 @@ import csv
 import sys, os
 import math
 import re
+import functools
+import struct
+import traceback
 from collections import defaultdict
+from collections import deque
 from collections import namedtuple
 import shutil
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 # this list is only used for autodetection
 known_devices = [
@@ -35,7 +43,25 @@ known_devices = [
 
 Device = namedtuple('Device', 'd decoder model')
 
+@functools.lru_cache(maxsize=None)
+def ble_uuid(short):
+    # 16 bit UUID on the bluetooth base UUID
+    return "0000{0:x}-0000-1000-8000-00805f9b34fb".format(short)
+
+def hex_string(data):
+    return ' '.join(map('0x{:02X}'.format, data))
+
 class LCD_Decoder(object):
+    __slots__ = ('model', 'notify_uuid', 'init_msg', 'poll_msg', 'stop_msg',
+        'flip_bits', 'flags', 'segments', 'strings', 'mode_strings', 'scaling',
+        '_scaling_rank', '_flag_table', '_flag_source', '_segment_table', '_segment_source',
+        '_flip_mask', '_flip_source')
+    modes = ('DC', 'AC', 'volts', 'amps', 'ohms', 'NCV', 'diode', 'continuity', 'celsius', 'fahrenheit', 'farads', 'hertz', '%duty', 'lux', 'fc', 'degrees', '%RH', 'grams', '(auto)', '(hold)', '(relative)', '(maximum)', '(minimum)', '(low_batt)')
+    mode_order = {m:i for i,m in enumerate(modes)}
+    # shared by every instance, do not modify in place
+    FLAGS = ()
+    SEGMENTS = {}
+    STRINGS = {}
     def __init__(self):
         self.model = ''
         self.notify_uuid = None
@@ -43,9 +69,9 @@ class LCD_Decoder(object):
         self.poll_msg = None
         self.stop_msg = None
         self.flip_bits = []
-        self.flags = []
-        self.segments = {}
-        self.strings = {}
+        self.flags = self.FLAGS
+        self.segments = self.SEGMENTS
+        self.strings = self.STRINGS
         self.mode_strings = {}
         self.scaling = {
             'negative': -1,
@@ -61,14 +87,60 @@ class LCD_Decoder(object):
             'x10': 10,
             'x100': 100,
         }
+        self._scaling_rank = {flag:i for i,flag in enumerate(self.scaling)}
+        self._flag_table = None
+        self._flag_source = None
+        self._segment_table = None
+        self._segment_source = None
+        self._flip_mask = 0
+        self._flip_source = None
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _compile_flags(flags):
+        # for every byte with flags, a 256 entry table of the flags each value sets
+        by_byte = defaultdict(list)
+        for flag,byte,bit in flags:
+            by_byte[byte].append((1<<bit, flag))
+        table = []
+        for byte,masks in by_byte.items():
+            lut = tuple(tuple(flag for mask,flag in masks if x & mask) for x in range(256))
+            table.append((byte, lut))
+        return tuple(table)
+    def decode_flags(self, data):
+        # self.flags can still be replaced after __init__, so compile lazily
+        if self._flag_source is not self.flags:
+            self._flag_table = self._compile_flags(tuple(self.flags))
+            self._flag_source = self.flags
+        lcd = {}
+        for byte,lut in self._flag_table:
+            for flag in lut[data[byte]]:
+                lcd[flag] = True
+        return lcd
+    def _compile_segments(self):
+        # 256 byte translation table, unknown patterns become '?'
+        table = bytearray(b'?' * 256)
+        for pattern,c in self.segments.items():
+            table[pattern] = ord(c)
+        self._segment_table = bytes(table)
+        self._segment_source = self.segments
+    def lookup_digits(self, patterns):
+        if self._segment_source is not self.segments:
+            self._compile_segments()
+        return bytes(patterns).translate(self._segment_table).decode('ascii')
+    def descramble(self, data):
+        # in place, data must be a bytearray
+        if self._flip_source is not self.flip_bits:
+            self._flip_mask = int.from_bytes(bytes(self.flip_bits), 'big')
+            self._flip_source = self.flip_bits
+        n = len(self.flip_bits)
+        if len(data) < n:
+            raise IndexError('data is shorter than flip_bits')
+        # one big integer xor across the whole scrambled prefix
+        data[:n] = (int.from_bytes(data[:n], 'big') ^ self._flip_mask).to_bytes(n, 'big')
     def decode_digits(self, data):
         pass
     def decode_lcd(self, data):
-        data = list(data)
-        lcd = {}
-        for flag,byte,bit in self.flags:
-            if data[byte] & (1<<bit):
-                lcd[flag] = True
+        lcd = self.decode_flags(data)
         lcd['digits'] = self.decode_digits(data)
         if lcd['digits'] in self.mode_strings:
             flag = self.mode_strings[lcd['digits']]
@@ -78,61 +150,68 @@ class LCD_Decoder(object):
         if lcd['digits'] in self.strings:
             return self.strings[lcd['digits']]
         n = int(lcd['digits'], 10)
-        for flag,x in self.scaling.items():
-            if flag in lcd:
-                n *= x
         if '(overload)' in lcd:
             return float('inf')
+        # only a few flags are set, so walk those instead of the scaling table
+        scaling = self.scaling
+        factors = [flag for flag in lcd if flag in scaling]
+        if len(factors) > 1:
+            # multiply in table order so the rounding never changes
+            factors.sort(key=self._scaling_rank.__getitem__)
+        for flag in factors:
+            n *= scaling[flag]
         return n
     def lcd_to_units(self, lcd):
-        modes = ['DC', 'AC', 'volts', 'amps', 'ohms', 'NCV', 'diode', 'continuity', 'celsius', 'fahrenheit', 'farads', 'hertz', '%duty', 'lux', 'fc', 'degrees', '%RH', 'grams', '(auto)', '(hold)', '(relative)', '(maximum)', '(minimum)', '(low_batt)']
-        return ' '.join(m for m in modes if m in lcd)
+        present = self.mode_order.keys() & lcd.keys()
+        return ' '.join(sorted(present, key=self.mode_order.__getitem__))
     def decode(self, data):
         lcd = self.decode_lcd(data)
         return [(lcd, self.lcd_to_number(lcd), self.lcd_to_units(lcd))]
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _compile_pattern(pattern):
+        # '.' is a wildcard byte
+        mask = bytes(0 if p == '.' else 0xFF for p in pattern)
+        value = bytes(0 if p == '.' else p for p in pattern)
+        return int.from_bytes(mask, 'big'), int.from_bytes(value, 'big'), len(pattern)
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _compile_pattern2(pattern):
+        # hex nibbles, '.' is a wildcard nibble
+        pattern = pattern.replace(' ', '')
+        mask = int(''.join('0' if p == '.' else 'F' for p in pattern), 16)
+        value = int(pattern.replace('.', '0'), 16)
+        return mask, value, len(pattern)
     def match(self, data, pattern):
-        if len(pattern) != len(data):
+        mask, value, length = self._compile_pattern(tuple(pattern))
+        if len(data) != length:
             return False
-        for p,d in zip(pattern, data):
-            if p == '.':
-                continue
-            if p != d:
-                return False
-        return True
+        return int.from_bytes(bytes(data), 'big') & mask == value
     def match2(self, data, pattern):
-        pattern = pattern.replace(' ', '')
-        if len(pattern) != len(data)*2:
+        mask, value, length = self._compile_pattern2(pattern)
+        if len(data)*2 != length:
             return False
-        for i,d in enumerate(data):
-            d1 = (d & 0xF0) >> 4
-            p1 = pattern[i*2]
-            if p1 != '.' and int(p1, 16) != d1:
-                return False
-            d2 = (d & 0x0F)
-            p2 = pattern[i*2+1]
-            if p2 != '.' and int(p2, 16) != d2:
-                return False
-        return True
+        return int.from_bytes(bytes(data), 'big') & mask == value
 
 class Dummy_Decoder(LCD_Decoder):
+    __slots__ = ('hide_known',)
+    byte_bits = tuple('{0:08b}'.format(x) for x in range(256))
     def __init__(self):
         super().__init__()
         self.model = 'dummy'
         self.hide_known = True
     def binary(self, data):
-        return ' '.join('{0:08b}'.format(x) for x in data)
+        return ' '.join(map(self.byte_bits.__getitem__, data))
     def hex(self, data):
-        return ' '.join('0x%02X' % x for x in data)
+        return hex_string(data)
     def unknown_binary(self, data):
-        bits = self.binary(data)
-        bits = list(bits)
+        bits = bytearray(self.binary(data), 'ascii')
         for flag,byte,bit in self.flags:
             x = 9 * byte + (7-bit)
-            bits[x] = '_'
-        return ''.join(bits)
+            bits[x] = ord('_')
+        return bits.decode('ascii')
     def decode(self, data):
-        for i,x in enumerate(self.flip_bits):
-            data[i] ^= x
+        self.descramble(data)
         lcd = self.decode_lcd(data)
         lcd['dummy'] = True
         if self.hide_known:
@@ -143,69 +222,64 @@ class Dummy_Decoder(LCD_Decoder):
         return [(lcd, bits, ' '.join(set(lcd) - set(['digits'])))]
 
 class TS04_Decoder(LCD_Decoder):
+    __slots__ = ()
+    FLAGS = (
+        ('negative', 1, 4),  # name, byte, bit  
+        ('(auto)', 1, 2),
+        ('DC', 1, 1),
+        ('AC', 1, 0),
+        ('/1000', 2, 4),
+        ('/100', 3, 4),
+        ('/10', 4, 4),
+        ('diode', 5, 7),
+        ('kilo', 5, 6),
+        ('micro', 5, 4),
+        ('(hold)', 6, 7),
+        ('ohms', 6, 5),
+        ('continuity', 6, 3),
+        ('mega', 6, 2),
+        ('milli', 6, 0),
+        ('NCV', 7, 7),
+        ('bluetooth', 7, 6),
+        ('celsius', 7, 5),
+        ('fahrenheit', 7, 4),
+        ('(low_batt)', 7, 3),
+        ('volts', 7, 1),
+        ('amps', 7, 0),
+        ('auto_off', 8, 0),
+    )
+    SEGMENTS = {
+        0b00000000: ' ',
+        0b11101011: '0',
+        0b00001010: '1',
+        0b10101101: '2',
+        0b10001111: '3',
+        0b01001110: '4',
+        0b11000111: '5',
+        0b11100111: '6',
+        0b10001010: '7',
+        0b11101111: '8',
+        0b11001111: '9',
+        0b01100001: 'L',
+        0b11100101: 'E',
+        0b11100100: 'F',
+        0b00000100: '-',
+    }
+    STRINGS = {
+        '    ': '?',
+        ' EF ': 0,
+        '   -': 1,
+        '  --': 2,
+        ' ---': 3,
+        '----': 4,
+        ' 0L ': float('inf'),
+    }
     def __init__(self):
         super().__init__()
         self.model = 'TS04'
-        self.notify_uuid = "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xFFB2)
-        self.flags = [
-            ('negative', 1, 4),  # name, byte, bit  
-            ('(auto)', 1, 2),
-            ('DC', 1, 1),
-            ('AC', 1, 0),
-            ('/1000', 2, 4),
-            ('/100', 3, 4),
-            ('/10', 4, 4),
-            ('diode', 5, 7),
-            ('kilo', 5, 6),
-            ('micro', 5, 4),
-            ('(hold)', 6, 7),
-            ('ohms', 6, 5),
-            ('continuity', 6, 3),
-            ('mega', 6, 2),
-            ('milli', 6, 0),
-            ('NCV', 7, 7),
-            ('bluetooth', 7, 6),
-            ('celsius', 7, 5),
-            ('fahrenheit', 7, 4),
-            ('(low_batt)', 7, 3),
-            ('volts', 7, 1),
-            ('amps', 7, 0),
-            ('auto_off', 8, 0),
-        ]
-        self.segments = {
-            0b00000000: ' ',
-            0b11101011: '0',
-            0b00001010: '1',
-            0b10101101: '2',
-            0b10001111: '3',
-            0b01001110: '4',
-            0b11000111: '5',
-            0b11100111: '6',
-            0b10001010: '7',
-            0b11101111: '8',
-            0b11001111: '9',
-            0b01100001: 'L',
-            0b11100101: 'E',
-            0b11100100: 'F',
-            0b00000100: '-',
-        }
-        self.strings = {
-            '    ': '?',
-            ' EF ': 0,
-            '   -': 1,
-            '  --': 2,
-            ' ---': 3,
-            '----': 4,
-            ' 0L ': float('inf'),
-        }
-    def merge_digit(self, byte1, byte2):
-        return self.segments[byte1 & 0b11100000 | byte2 & 0b1111]
+        self.notify_uuid = ble_uuid(0xFFB2)
     def decode_digits(self, data):
-        digit1 = self.merge_digit(data[1], data[2])
-        digit2 = self.merge_digit(data[2], data[3])
-        digit3 = self.merge_digit(data[3], data[4])
-        digit4 = self.merge_digit(data[4], data[5])
-        return digit1 + digit2 + digit3 + digit4
+        return self.lookup_digits(data[i] & 0b11100000 | data[i+1] & 0b1111 for i in (1, 2, 3, 4))
     def decode(self, data):
         if data == b'SPP:sendData 08\\s\\n\\':
             return [(None, None, None)]
@@ -215,66 +289,61 @@ class TS04_Decoder(LCD_Decoder):
         return [(lcd, self.lcd_to_number(lcd), self.lcd_to_units(lcd))]
 
 class HP90EPD_Decoder(LCD_Decoder):
+    __slots__ = ('buffer',)
+    # lcd has hFE but its unused
+    FLAGS = (
+        ('(auto)', 0, 1),  # name, byte, bit
+        ('AC', 0, 3),
+        ('(hold)', 11, 0),
+        ('mega', 10, 1),
+        ('kilo', 9, 1),
+        ('milli', 10, 3),
+        ('micro', 9, 3),
+        ('nano', 9, 2),
+        ('diode', 9, 0),
+        ('continuity', 10, 0),
+        ('%duty', 10, 2),
+        ('(relative)', 11, 1),
+        ('ohms', 11, 2),
+        ('farads', 11, 3),
+        ('hertz', 12, 1),
+        ('volts', 12, 2),
+        ('amps', 12, 3),
+        ('celsius', 13, 2),
+        ('negative', 1, 3),
+        ('/1000', 3, 3),
+        ('/100', 5, 3),
+        ('/10', 7, 3),
+        ('(low_batt)', 12, 0),
+        ('mystery_1', 0, 2),
+        ('mystery_2', 13, 0),
+    )
+    SEGMENTS = {
+        0b0000000: ' ',
+        0b1111101: '0',
+        0b0000101: '1',
+        0b1011011: '2',
+        0b0011111: '3',
+        0b0100111: '4',
+        0b0111110: '5',
+        0b1111110: '6',
+        0b0010101: '7',
+        0b1111111: '8',
+        0b0111111: '9',
+        0b1101000: 'L',
+    }
+    STRINGS = {
+        '    ': '?',
+        ' 0L ': float('inf'),
+    }
     def __init__(self):
         super().__init__()
         self.model = 'HP90EPD'
-        self.notify_uuid = "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xFFB2)
+        self.notify_uuid = ble_uuid(0xFFB2)
         self.buffer = []
-        # lcd has hFE but its unused
-        self.flags = [
-            ('(auto)', 0, 1),  # name, byte, bit
-            ('AC', 0, 3),
-            ('(hold)', 11, 0),
-            ('mega', 10, 1),
-            ('kilo', 9, 1),
-            ('milli', 10, 3),
-            ('micro', 9, 3),
-            ('nano', 9, 2),
-            ('diode', 9, 0),
-            ('continuity', 10, 0),
-            ('%duty', 10, 2),
-            ('(relative)', 11, 1),
-            ('ohms', 11, 2),
-            ('farads', 11, 3),
-            ('hertz', 12, 1),
-            ('volts', 12, 2),
-            ('amps', 12, 3),
-            ('celsius', 13, 2),
-            ('negative', 1, 3),
-            ('/1000', 3, 3),
-            ('/100', 5, 3),
-            ('/10', 7, 3),
-            ('(low_batt)', 12, 0),
-            ('mystery_1', 0, 2),
-            ('mystery_2', 13, 0),
-        ]
-        self.segments = {
-            0b0000000: ' ',
-            0b1111101: '0',
-            0b0000101: '1',
-            0b1011011: '2',
-            0b0011111: '3',
-            0b0100111: '4',
-            0b0111110: '5',
-            0b1111110: '6',
-            0b0010101: '7',
-            0b1111111: '8',
-            0b0111111: '9',
-            0b1101000: 'L',
-        }
-        self.strings = {
-            '    ': '?',
-            ' 0L ': float('inf'),
-        }
-    def merge_digit(self, byte1, byte2):
-        # lo left      hi left       top       bottom       lo right        center        hi right
-        return self.segments[(byte1 & 0b111) << 4 | (byte2 & 0b1111)]
     def decode_digits(self, data):
-        digit1 = self.merge_digit(data[1], data[2])
-        digit2 = self.merge_digit(data[3], data[4])
-        digit3 = self.merge_digit(data[5], data[6])
-        digit4 = self.merge_digit(data[7], data[8])
-        return digit1 + digit2 + digit3 + digit4
+        # lo left      hi left       top       bottom       lo right        center        hi right
+        return self.lookup_digits((data[i] & 0b111) << 4 | data[i+1] & 0b1111 for i in (1, 3, 5, 7))
     def decode(self, data):
         if len(data) == 8:
             self.buffer = data
@@ -292,60 +361,61 @@ class HP90EPD_Decoder(LCD_Decoder):
         return [(lcd, self.lcd_to_number(lcd), self.lcd_to_units(lcd))]
 
 class AN9002_Decoder(LCD_Decoder):
+    __slots__ = ()
+    FLAGS = (
+        ('(auto)', 10, 0),  # name, byte, bit
+        ('/1000', 4, 4),
+        ('/100', 5, 4),
+        ('/10', 6, 4),
+        ('(relative)', 3, 1),
+        ('(maximum)', 8, 0),
+        ('(minimum)', 8, 1),
+        ('AC', 8, 3),
+        ('DC', 9, 6),
+        ('hertz', 9, 0),
+        ('%duty', 8, 2),
+        ('(hold)', 7, 4),
+        ('milli', 9, 5),  # mV
+        ('negative', 3, 4),
+        ('celsius', 7, 6),
+        ('fahrenheit', 7, 5),
+        ('volts', 9, 4),
+        ('ohms', 9, 1),
+        ('mega', 9, 3),  # M ohm
+        ('kilo', 9, 2),  # k ohm
+        ('farads', 8, 4),
+        ('nano', 8, 7),  # nF
+        ('micro', 8, 5),  # uF
+        ('milli', 8, 6),  # mF
+        ('amps', 9, 7),
+        ('milli', 10, 3),  # mA
+        ('micro', 10, 2),  # uA
+        ('diode', 7, 7),
+        ('continuity', 3, 3),
+        ('(low_batt)', 3, 0),
+    )
+    STRINGS = {
+        'Auto': '?',
+        '    ': '?',
+        ' EF ': 0,
+        '-   ': 1,
+        '--  ': 2,
+        '--- ': 3,
+        '----': 4,
+        ' 0L ': float('inf'),
+    }
+    SEGMENTS = {
+        **TS04_Decoder.SEGMENTS,
+        0b11101110: 'A',
+        0b00100011: 'u',
+        0b01100101: 't',
+        0b00100111: 'o',
+    }
     def __init__(self):
         super().__init__()
         self.model = 'AN9002'
-        self.notify_uuid = "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xFFF4)
+        self.notify_uuid = ble_uuid(0xFFF4)
         self.flip_bits = [0x1B,0x84,0x70,0x55,0xA2,0xC1,0x32,0x71,0x66,0xAA,0x3B]
-        self.flags = [
-            ('(auto)', 10, 0),  # name, byte, bit
-            ('/1000', 4, 4),
-            ('/100', 5, 4),
-            ('/10', 6, 4),
-            ('(relative)', 3, 1),
-            ('(maximum)', 8, 0),
-            ('(minimum)', 8, 1),
-            ('AC', 8, 3),
-            ('DC', 9, 6),
-            ('hertz', 9, 0),
-            ('%duty', 8, 2),
-            ('(hold)', 7, 4),
-            ('milli', 9, 5),  # mV
-            ('negative', 3, 4),
-            ('celsius', 7, 6),
-            ('fahrenheit', 7, 5),
-            ('volts', 9, 4),
-            ('ohms', 9, 1),
-            ('mega', 9, 3),  # M ohm
-            ('kilo', 9, 2),  # k ohm
-            ('farads', 8, 4),
-            ('nano', 8, 7),  # nF
-            ('micro', 8, 5),  # uF
-            ('milli', 8, 6),  # mF
-            ('amps', 9, 7),
-            ('milli', 10, 3),  # mA
-            ('micro', 10, 2),  # uA
-            ('diode', 7, 7),
-            ('continuity', 3, 3),
-            ('(low_batt)', 3, 0),
-        ]
-        self.segments = dict(TS04_Decoder().segments)
-        self.segments.update({
-            0b11101110: 'A',
-            0b00100011: 'u',
-            0b01100101: 't',
-            0b00100111: 'o',
-        })
-        self.strings = {
-            'Auto': '?',
-            '    ': '?',
-            ' EF ': 0,
-            '-   ': 1,
-            '--  ': 2,
-            '--- ': 3,
-            '----': 4,
-            ' 0L ': float('inf'),
-        }
         self.mode_strings = {
             ' EF ': 'NCV',
             '-   ': 'NCV',
@@ -353,82 +423,72 @@ class AN9002_Decoder(LCD_Decoder):
             '--- ': 'NCV',
             '----': 'NCV',
         }
-    def merge_digit(self, byte1, byte2):
-        x = byte1 & 0b11100000 | byte2 & 0b1111
-        return self.segments[byte1 & 0b11100000 | byte2 & 0b1111]
     def decode_digits(self, data):
-        digit1 = self.merge_digit(data[3], data[4])
-        digit2 = self.merge_digit(data[4], data[5])
-        digit3 = self.merge_digit(data[5], data[6])
-        digit4 = self.merge_digit(data[6], data[7])
-        return digit1 + digit2 + digit3 + digit4
+        return self.lookup_digits(data[i] & 0b11100000 | data[i+1] & 0b1111 for i in (3, 4, 5, 6))
     def decode(self, data):
         if len(data) != 11:
             return [(None, None, None)]
         # bytes [0:2] are constant?
-        for i,x in enumerate(self.flip_bits):
-            data[i] ^= x
+        self.descramble(data)
         lcd = self.decode_lcd(data)
         return [(lcd, self.lcd_to_number(lcd), self.lcd_to_units(lcd))]
 
 class V05B_Decoder(AN9002_Decoder):
+    __slots__ = ()
+    FLAGS = (
+        ('/1000', 4, 4),
+        ('/100', 5, 4),
+        ('/10', 6, 4),
+        ('AC', 8, 3),
+        ('DC', 8, 2),
+        ('hertz', 9, 5),
+        ('(hold)', 3, 1),
+        ('high_volt', 3, 2),
+        ('buzzer', 3, 3),
+        ('negative', 3, 4),
+        ('celsius', 9, 7),
+        ('fahrenheit', 9, 6),
+        ('volts', 8, 1),
+        ('ohms', 9, 0),
+        ('mega', 9, 3),  # M ohm
+        ('kilo', 9, 1),  # k ohm
+        ('farads', 8, 4),
+        ('nano', 8, 0),
+        ('micro', 8, 7),
+        ('milli', 9, 2),
+        ('amps', 8, 6),
+        ('diode', 8, 5),
+        # auto_off?  low_batt?  continuity?  %duty?
+    )
     def __init__(self):
         super().__init__()
         self.model = 'V05B'
         self.flip_bits = self.flip_bits[:10]
-        self.flags = [
-            ('/1000', 4, 4),
-            ('/100', 5, 4),
-            ('/10', 6, 4),
-            ('AC', 8, 3),
-            ('DC', 8, 2),
-            ('hertz', 9, 5),
-            ('(hold)', 3, 1),
-            ('high_volt', 3, 2),
-            ('buzzer', 3, 3),
-            ('negative', 3, 4),
-            ('celsius', 9, 7),
-            ('fahrenheit', 9, 6),
-            ('volts', 8, 1),
-            ('ohms', 9, 0),
-            ('mega', 9, 3),  # M ohm
-            ('kilo', 9, 1),  # k ohm
-            ('farads', 8, 4),
-            ('nano', 8, 0),
-            ('micro', 8, 7),
-            ('milli', 9, 2),
-            ('amps', 8, 6),
-            ('diode', 8, 5),
-            # auto_off?  low_batt?  continuity?  %duty?
-        ]
     def decode(self, data):
         if len(data) != 10:
             return [(None, None, None)]
-        for i,x in enumerate(self.flip_bits):
-            data[i] ^= x
+        self.descramble(data)
         lcd = self.decode_lcd(data)
         #lcd['auto'] = True
         return [(lcd, self.lcd_to_number(lcd), self.lcd_to_units(lcd))]
 
 class WT81B_Decoder(LCD_Decoder):
+    __slots__ = ()
+    FLAGS = (
+        ('x100', 3, 1),  # name, byte, bit
+        ('x10', 3, 0),
+    )
+    # missing flags: rec read del bt auto-off bat-0/1/2/3 hold max min delta hi-lum lo-lum neg-temp backlight
     def __init__(self):
         super().__init__()
         self.model = 'WT81B'
-        self.notify_uuid = "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xFF02)
-        self.poll_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xFF01), 'payload': [0x57, 0x48, 0x01], 'sleep':0.5}
-        self.flags = [
-            ('x100', 3, 1),  # name, byte, bit
-            ('x10', 3, 0),
-        ]
-        # missing flags: rec read del bt auto-off bat-0/1/2/3 hold max min delta hi-lum lo-lum neg-temp backlight
+        self.notify_uuid = ble_uuid(0xFF02)
+        self.poll_msg = {'uuid': ble_uuid(0xFF01), 'payload': bytes((0x57, 0x48, 0x01)), 'sleep':0.5}
     def decode_lcd(self, data):
-        data = list(data)
-        lcd = {}
-        for flag,byte,bit in self.flags:
-            if data[byte] & (1<<bit):
-                lcd[flag] = True
-        lcd['temperature'] = ((data[4] << 8) | data[5]) / 10  # what about below 0?
-        lcd['lux'] = ((data[6] << 8) | data[7]) / 10
+        lcd = self.decode_flags(data)
+        temperature, lux = struct.unpack_from('>HH', data, 4)
+        lcd['temperature'] = temperature / 10  # what about below 0?
+        lcd['lux'] = lux / 10
         if 'x10' in lcd:
             lcd['lux'] *= 10
         if 'x100' in lcd:
@@ -438,36 +498,37 @@ class WT81B_Decoder(LCD_Decoder):
             lcd['lux'] = float('inf')
         return lcd
     def decode(self, data):
-        data = list(data)
+        data = memoryview(data)
         if not self.match(data, [0xFF, 0x57, 0x4C, '.', '.', '.', '.', '.']) or data[3] > 3:
-            print('WARNING: unrecognized', self.model, 'data', ' '.join('0x%02X' % n for n in data)) 
+            print('WARNING: unrecognized', self.model, 'data', hex_string(data)) 
             return [(None, None, None)]
         lcd = self.decode_lcd(data)
         return [(lcd, lcd['lux'], 'lux'),
                 (lcd, lcd['temperature'], 'celsius')]
 
 class UT383BT_Decoder(LCD_Decoder):
+    __slots__ = ()
+    FLAGS = (
+        ('(hold)', 16, 0),  # name, byte, bit
+        ('(maximum)', 16, 3),
+        ('(minimum)', 16, 2),
+        #('lux', 14, 1),
+        #('fc', 14, 2),  # the reported number is still lux despite the on-screen unit
+        ('(low_batt)', 16, 6),
+    )
+    # missing flags: auto_off
+    STRINGS = {
+        '    OL': float('inf'),
+    }
     def __init__(self):
         super().__init__()
         self.model = 'UT383BT'
-        self.notify_uuid = "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xFF02)
-        self.poll_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xFF01), 'payload': [0x5E], 'sleep':0.5}
-        self.flags = [
-            ('(hold)', 16, 0),  # name, byte, bit
-            ('(maximum)', 16, 3),
-            ('(minimum)', 16, 2),
-            #('lux', 14, 1),
-            #('fc', 14, 2),  # the reported number is still lux despite the on-screen unit
-            ('(low_batt)', 16, 6),
-        ]
-        self.strings = {
-            '    OL': float('inf'),
-        }
-        # missing flags: auto_off
+        self.notify_uuid = ble_uuid(0xFF02)
+        self.poll_msg = {'uuid': ble_uuid(0xFF01), 'payload': bytes((0x5E,)), 'sleep':0.5}
     def decode(self, data):
-        data = list(data)
+        data = memoryview(data)
         if not self.match(data, [0xAA, 0xBB, 0x10, 0x01, 0x3A, '.', '.', '.', '.', '.', '.', 0x4C, 0x55, 0x58, '.', 0x30, '.', '.', '.']):
-            print('WARNING: unrecognized', self.model, 'data', ' '.join('0x%02X' % n for n in data)) 
+            print('WARNING: unrecognized', self.model, 'data', hex_string(data)) 
             return [(None, None, None)]
         lcd = self.decode_lcd(data)
         lcd['lux'] = True
@@ -475,48 +536,43 @@ class UT383BT_Decoder(LCD_Decoder):
         return [(lcd, self.lcd_to_number(lcd), self.lcd_to_units(lcd))]
 
 class TP357_Decoder(LCD_Decoder):
+    __slots__ = ()
+    FLAGS = (
+        ('(???)', 2, 0),  # name, byte, bit
+    )
+    # missing flags: low_batt comfort
     def __init__(self):
         super().__init__()
         self.model = 'TP357'
         self.notify_uuid = '00010203-0405-0607-0809-0a0b0c0d{0:x}'.format(0x2B10)
-        self.flags = [
-            ('(???)', 2, 0),  # name, byte, bit
-        ]
-        # missing flags: low_batt comfort
     def decode_lcd(self, data):
-        data = list(data)
-        lcd = {}
-        for flag,byte,bit in self.flags:
-            if data[byte] & (1<<bit):
-                lcd[flag] = True
-        temp = (data[4] << 8) | data[3]
-        if temp & 0x8000: 
-            temp = n - 0x10000
-        lcd['temperature'] = temp / 10
+        lcd = self.decode_flags(data)
+        lcd['temperature'] = struct.unpack_from('<h', data, 3)[0] / 10
         lcd['humidity'] = data[5]
         return lcd
     def decode(self, data):
-        data = list(data)
+        data = memoryview(data)
         if not self.match(data, [0xC2, 0x00, '.', '.', '.', '.', 0x2C]) or data[2] > 1:
-            print('WARNING: unrecognized', self.model, 'data', ' '.join('0x%02X' % n for n in data)) 
+            print('WARNING: unrecognized', self.model, 'data', hex_string(data)) 
             return [(None, None, None)]
         lcd = self.decode_lcd(data)
         return [(lcd, lcd['temperature'], 'celsius'),
                 (lcd, lcd['humidity'], '%RH')]
 
 class TS02_Decoder(LCD_Decoder):
+    __slots__ = ()
+    FLAGS = (
+        ('negative', 0, 2),  # name, byte, bit
+        ('positive', 0, 1),
+    )
     def __init__(self):
         super().__init__()
         self.model = 'TS02'
         self.notify_uuid = "0783b03e-8535-b5a0-7140-a304d249{0:x}".format(0x5cb8)
-        self.poll_msg = {'uuid': "0783b03e-8535-b5a0-7140-a304d249{0:x}".format(0x5cb9), 'payload': [0x00, 0x00], 'sleep':1.0}
+        self.poll_msg = {'uuid': "0783b03e-8535-b5a0-7140-a304d249{0:x}".format(0x5cb9), 'payload': bytes((0x00, 0x00)), 'sleep':1.0}
         # 5cb8   notify "Server TX Data"
         # 5cba   write "Server RX Data"
         # 5cb9   read/write/notify "Flow Control"
-        self.flags = [
-            ('negative', 0, 2),  # name, byte, bit
-            ('positive', 0, 1),
-        ]
         # low battery?
     def check(self, data):
         if data[0] & 0b11111001 != 0b00101001:
@@ -533,16 +589,12 @@ class TS02_Decoder(LCD_Decoder):
             return False
         return True
     def decode_digits(self, data):
-        # binary coded decimal
-        digit1 = str(data[1] & 0x0F)
-        digit2 = str(data[2] & 0x0F)
-        digit3 = str(data[3] & 0x0F)
-        digit4 = str(data[4] & 0x0F)
-        return digit1 + digit2 + digit3 + digit4
+        # binary coded decimal, 0x30 turns each nibble into its ascii digit
+        return bytes(data[i] & 0x0F | 0x30 for i in (1, 2, 3, 4)).decode('ascii')
     def decode(self, data):
-        data = list(data)
+        data = memoryview(data)
         if not self.check(data):
-            print('WARNING: unrecognized', self.model, 'data', ' '.join('0x%02X' % n for n in data)) 
+            print('WARNING: unrecognized', self.model, 'data', hex_string(data)) 
             return [(None, None, None)]
         lcd = self.decode_lcd(data)
         lcd['degrees'] = True
@@ -550,24 +602,25 @@ class TS02_Decoder(LCD_Decoder):
         return [(lcd, self.lcd_to_number(lcd), self.lcd_to_units(lcd))]
 
 class K1705_Decoder(LCD_Decoder):
+    __slots__ = ()
+    FLAGS = (
+        ('(overload)', 10, 7),  # name, byte, bit  
+        ('negative', 10, 4),
+    )
     def __init__(self):
         super().__init__()
         self.model = 'K1705'
-        self.notify_uuid = "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xfff1)
-        self.flags = [
-            ('(overload)', 10, 7),  # name, byte, bit  
-            ('negative', 10, 4),
-        ]
+        self.notify_uuid = ble_uuid(0xfff1)
         # low battery?
     def decode_digits(self, data):
-        n = (data[11] << 16) + (data[12] << 8) + data[13]
+        n = int.from_bytes(data[11:14], 'big')
         return str(n)  # stupid
     def decode(self, data):
-        data = list(data)
+        data = memoryview(data)
         if len(data) == 128:
             return [(None, None, None)]
         if not self.match(data, [0xA3, 0xBE, 0x15, 0x92, 0x93, 0, 0, 0xA0, 0, 0, '.', '.', '.', '.', 0xFF, 0x3E, 0xBA]):
-            print('WARNING: unrecognized', self.model, 'data', ' '.join('0x%02X' % n for n in data)) 
+            print('WARNING: unrecognized', self.model, 'data', hex_string(data)) 
             return [(None, None, None)]
         lcd = self.decode_lcd(data)
         lcd['grams'] = True
@@ -575,98 +628,111 @@ class K1705_Decoder(LCD_Decoder):
         return [(lcd, self.lcd_to_number(lcd), self.lcd_to_units(lcd))]
 
 class BT980D_Decoder(LCD_Decoder):
+    __slots__ = ()
+    FLAGS = (
+        ('laser', 5, 2),  # name, byte, bit  
+        ('celsius', 5, 0),
+        ('fahrenheit', 5, 1),
+        ('backlight', 5, 3,)
+    )
     def __init__(self):
         super().__init__()
         self.model = 'BT980D'
-        self.notify_uuid = "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffe2)
-        #self.init_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffe1), 'payload': self.build_message([3, 1]), 'sleep':1.0}
-        self.poll_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffe1), 'payload': self.build_message([3, 1]), 'sleep':1.0}
-        self.flags = [
-            ('laser', 5, 2),  # name, byte, bit  
-            ('celsius', 5, 0),
-            ('fahrenheit', 5, 1),
-            ('backlight', 5, 3,)
-        ]
+        self.notify_uuid = ble_uuid(0xffe2)
+        #self.init_msg = {'uuid': ble_uuid(0xffe1), 'payload': self.build_message([3, 1]), 'sleep':1.0}
+        self.poll_msg = {'uuid': ble_uuid(0xffe1), 'payload': self.build_message([3, 1]), 'sleep':1.0}
         # batt scan [H] BT laser H L C F temperature LAL MAX HAL AVG MEM E MIN NO emissivity
         # auto-off?
     def build_message(self, data):
         length = len(data)
         checksum = (0x20 + length + sum(data)) & 0xFF
-        return [0xA7, 0, 0x20, length] + list(data) + [checksum, 0x7A]
+        return bytes([0xA7, 0, 0x20, length, *data, checksum, 0x7A])
     def decode(self, data):
-        data = list(data)
+        data = memoryview(data)
         if self.match(data, [0xA7, 0x00, 0x20, 0x07, 0x85, 0x7D, 0x43, 0x33, 0x48, 0xDE, 0x70, 0x35, 0x7A]):
             return [(None, None, None)]
         if not self.match(data, [0xA7, 0x00, 0x20, 0x0B, 0x8D, '.', '.', 0xC9, '.', '.', 0x8F, '.', '.', 0xCC, 0xBD, '.', 0x7A]):
-            print('WARNING: unrecognized', self.model, 'data', ' '.join('0x%02X' % n for n in data)) 
+            print('WARNING: unrecognized', self.model, 'data', hex_string(data)) 
             return [(None, None, None)]
         lcd = self.decode_lcd(data)
-        return [(lcd, Dummy_Decoder().hex(data), ' '.join(sorted(list(set(lcd) - set(['digits'])))))]
+        return [(lcd, hex_string(data), ' '.join(sorted(list(set(lcd) - set(['digits'])))))]
 
 class BT7200_APP_Decoder(LCD_Decoder):
+    __slots__ = ()
+    FLAGS = (
+        ('(hold)', 11, 3),  # name, byte, bit
+        ('(auto)', 0, 2),
+        ('(minimum)', 14, 1),
+        ('(maximum)', 14, 3),
+        ('(relative)', 11, 2),
+        ('(low_batt)', 12, 3),
+        ('diode', 9, 3),
+        ('continuity', 10, 3),
+        ('/1000', 3, 0),
+        ('/100', 5, 0),
+        ('/10', 7, 0),
+        ('negative', 1, 0),
+        ('milli', 10, 0),
+        ('mega', 10, 2),
+        ('DC', 0, 1),
+        ('AC', 0, 0),
+        ('ohms', 11, 1),
+        ('hertz', 12, 2),
+        ('%duty', 10, 1),
+        ('celsius', 13, 1),
+        ('fahrenheit', 13, 0),
+        ('NCV', 13, 3),
+        ('amps', 12, 0),
+        ('volts', 12, 1),
+    )
+    # there is no auto-off?
+    # no flag for the backlight
+    # todo: farads, nano, micro, kilo, auto-off, overload
+    SEGMENTS = TS04_Decoder.SEGMENTS
+    STRINGS = AN9002_Decoder.STRINGS
+    # the high nibble of every byte counts up from 1
+    high_nibbles = bytes(x & 0xF0 for x in range(256))
+    sequence = bytes(range(0x10, 0x100, 0x10))
+    sequence_short = sequence[:-1]
+    sequence_long = b'\xF0' + sequence
     def __init__(self):
         super().__init__()
         self.model = 'BT7200_APP'
-        self.notify_uuid = "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffe2)
-        #self.init_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffe1), 'payload': self.build_message([3, 1]), 'sleep':1.0}
-        #self.poll_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffe1), 'payload': [171, 205, 6], 'sleep':1.0, 'response':False}
-        self.poll_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffe1), 'payload': [13, 151], 'sleep':1.0, 'response':False}
+        self.notify_uuid = ble_uuid(0xffe2)
+        #self.init_msg = {'uuid': ble_uuid(0xffe1), 'payload': self.build_message([3, 1]), 'sleep':1.0}
+        #self.poll_msg = {'uuid': ble_uuid(0xffe1), 'payload': [171, 205, 6], 'sleep':1.0, 'response':False}
+        self.poll_msg = {'uuid': ble_uuid(0xffe1), 'payload': bytes((13, 151)), 'sleep':1.0, 'response':False}
         # brute force found "(13, 151) 81" but doesn't work?
-        self.flags = [
-            ('(hold)', 11, 3),  # name, byte, bit
-            ('(auto)', 0, 2),
-            ('(minimum)', 14, 1),
-            ('(maximum)', 14, 3),
-            ('(relative)', 11, 2),
-            ('(low_batt)', 12, 3),
-            ('diode', 9, 3),
-            ('continuity', 10, 3),
-            ('/1000', 3, 0),
-            ('/100', 5, 0),
-            ('/10', 7, 0),
-            ('negative', 1, 0),
-            ('milli', 10, 0),
-            ('mega', 10, 2),
-            ('DC', 0, 1),
-            ('AC', 0, 0),
-            ('ohms', 11, 1),
-            ('hertz', 12, 2),
-            ('%duty', 10, 1),
-            ('celsius', 13, 1),
-            ('fahrenheit', 13, 0),
-            ('NCV', 13, 3),
-            ('amps', 12, 0),
-            ('volts', 12, 1),
-        ]
-        # there is no auto-off?
-        # no flag for the backlight
-        # todo: farads, nano, micro, kilo, auto-off, overload
-        self.segments = dict(TS04_Decoder().segments)
-        self.strings = dict(AN9002_Decoder().strings)
-    def merge_digit(self, byte1, byte2):
-        return self.segments[((byte1 & 0b1110)<<4) | byte2 & 0b1111]
     def decode_digits(self, data):
-        digit1 = self.merge_digit(data[1], data[2])
-        digit2 = self.merge_digit(data[3], data[4])
-        digit3 = self.merge_digit(data[5], data[6])
-        digit4 = self.merge_digit(data[7], data[8])
-        return digit1 + digit2 + digit3 + digit4
+        return self.lookup_digits((data[i] & 0b1110) << 4 | data[i+1] & 0b1111 for i in (1, 3, 5, 7))
     def decode(self, data):
-        data = list(data)
+        data = bytearray(data)
+        sequence = data.translate(self.high_nibbles)
         # it gets sloppy with blocks of data
         # attempt to recover
-        if self.match2(data, '1.2.3.4.5.6.7.8.9.A.B.C.D.E.'):
+        if sequence == self.sequence_short:
             data.append(0xF0)
-        if self.match2(data, 'F.1.2.3.4.5.6.7.8.9.A.B.C.D.E.F.'):
+            sequence.append(0xF0)
+        elif sequence == self.sequence_long:
             data = data[1:]
-        if not self.match2(data, '1.2.3.4.5.6.7.8.9.A.B.C.D.E.F.'):
-            print('WARNING: unrecognized', self.model, 'data', ' '.join('0x%02X' % n for n in data)) 
+            sequence = sequence[1:]
+        if sequence != self.sequence:
+            print('WARNING: unrecognized', self.model, 'data', hex_string(data)) 
             return [(None, None, None)]
         lcd = self.decode_lcd(data)
-        #return [(lcd, Dummy_Decoder().hex(data), ' '.join(sorted(list(set(lcd) - set(['digits'])))))]
+        #return [(lcd, hex_string(data), ' '.join(sorted(list(set(lcd) - set(['digits'])))))]
         return [(lcd, self.lcd_to_number(lcd), self.lcd_to_units(lcd))]
 
 class BT985C_APP_Decoder(LCD_Decoder):
+    __slots__ = ('commands',)
+    FLAGS = (
+        ('fahrenheit', 6, 6),  # name, byte, bit
+        ('(scan)', 6, 0),
+        ('(memory)', 6, 1),
+        ('(laser)', 6, 2),
+        ('(backlight)', 6, 3),
+        ('(low_batt)', 6, 4),
+    )
     def __init__(self):
         super().__init__()
         self.model = 'BT985C_APP'
@@ -674,20 +740,12 @@ class BT985C_APP_Decoder(LCD_Decoder):
             'rate':32, 'stop':33, 'off':64, 'emissivity':80}
         # brute force scan for other commands?
         btn_boot = [256-84,256-1,256-2, 21, 1, 0,256-52,256-32]  # why is this checksum off by one?
-        self.notify_uuid = "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffb2)
-        self.init_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffb1), 'payload': self.message('rate', 0), 'sleep':0.5}
-        #self.init_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffb1), 'payload': btn_boot, 'sleep':0.5}
-        self.poll_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffb1), 'payload': self.message('rate', 0), 'sleep':5}
-        #self.stop_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffb1), 'payload': self.message('stop'), 'sleep':0.1}
-        self.stop_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffb1), 'payload': self.message('off'), 'sleep':0.1}
-        self.flags = [
-            ('fahrenheit', 6, 6),  # name, byte, bit
-            ('(scan)', 6, 0),
-            ('(memory)', 6, 1),
-            ('(laser)', 6, 2),
-            ('(backlight)', 6, 3),
-            ('(low_batt)', 6, 4),
-        ]
+        self.notify_uuid = ble_uuid(0xffb2)
+        self.init_msg = {'uuid': ble_uuid(0xffb1), 'payload': self.message('rate', 0), 'sleep':0.5}
+        #self.init_msg = {'uuid': ble_uuid(0xffb1), 'payload': btn_boot, 'sleep':0.5}
+        self.poll_msg = {'uuid': ble_uuid(0xffb1), 'payload': self.message('rate', 0), 'sleep':5}
+        #self.stop_msg = {'uuid': ble_uuid(0xffb1), 'payload': self.message('stop'), 'sleep':0.1}
+        self.stop_msg = {'uuid': ble_uuid(0xffb1), 'payload': self.message('off'), 'sleep':0.1}
         # auto-off?
         # sends data on every button press!  sometimes two packets are concatenated
         # writing data into ffb1 causes the button to happen, also sends data matching as if the button were pressed?
@@ -699,18 +757,11 @@ class BT985C_APP_Decoder(LCD_Decoder):
         command = self.commands[command]
         message = [0xBC, command, (value>>8) & 0xFF, value & 0xFF]
         message.append(sum(message[1:]) & 0xFF)
-        return message
-    def _16bit_temperature(self, b1, b2):
-        t = b1 + (b2<<8)
-        if b2 & 0x80:
-            t -= 2**16
-        return t / 10.0
+        return bytes(message)
+    def _16bit_temperature(self, data, offset):
+        return struct.unpack_from('<h', data, offset)[0] / 10.0
     def decode_lcd(self, data):
-        data = list(data)
-        lcd = {}
-        for flag,byte,bit in self.flags:
-            if data[byte] & (1<<bit):
-                lcd[flag] = True
+        lcd = self.decode_flags(data)
         if 'fahrenheit' not in lcd:
             lcd['celsius'] = True
         if '(scan)' not in lcd:
@@ -719,21 +770,21 @@ class BT985C_APP_Decoder(LCD_Decoder):
                       3:'low_alarm_celsius', 4:'high_alarm_celsius', 5:'ε'}
         mode = data[1]
         if mode in [0, 1, 2, 3, 4]:
-            temp2 = self._16bit_temperature(data[2], data[3])
+            temp2 = self._16bit_temperature(data, 2)
             lcd['minor_reading'] = temp2
         if mode == 5:
             lcd['minor_reading'] = data[3] / 100
         lcd['minor_unit'] = mode_table[mode]
-        lcd['temperature'] = self._16bit_temperature(data[4], data[5])
+        lcd['temperature'] = self._16bit_temperature(data, 4)
         # what about memory stuff?
         return lcd
     def decode(self, data):
-        data = list(data)
+        data = memoryview(data)
         if not self.match2(data, 'BC 0. .. .. .. .. .. ..'):
-            print('WARNING: unrecognized', self.model, 'data', ' '.join('0x%02X' % n for n in data)) 
+            print('WARNING: unrecognized', self.model, 'data', hex_string(data)) 
             return [(None, None, None)]
         lcd = self.decode_lcd(data)
-        #return [(lcd, Dummy_Decoder().hex(data), ' '.join(sorted(list(set(lcd) - set(['digits'])))))]
+        #return [(lcd, hex_string(data), ' '.join(sorted(list(set(lcd) - set(['digits'])))))]
         # temperature unit is cosmetic
         # always reports in C
         return [(lcd, lcd['minor_reading'], lcd['minor_unit']),
@@ -742,95 +793,183 @@ class BT985C_APP_Decoder(LCD_Decoder):
         # might be missing an important message
 
 
+class MessageQueue(object):
+    # the parts of queue.Queue the session uses, on a deque with one lock
+    def __init__(self):
+        self._items = deque()
+        self._ready = threading.Condition(threading.Lock())
+        self._closed = False
+    def put(self, item):
+        with self._ready:
+            self._items.append(item)
+            self._ready.notify()
+    def get(self, block=True, timeout=None):
+        if block and not self._items:
+            with self._ready:
+                self._ready.wait_for(lambda: self._items or self._closed, timeout)
+        return self.get_nowait()
+    def get_nowait(self):
+        # popleft is atomic, no lock needed
+        try:
+            return self._items.popleft()
+        except IndexError:
+            raise queue.Empty
+    def empty(self):
+        return not self._items
+    def close(self):
+        # wake any waiting get(), later calls no longer block
+        with self._ready:
+            self._closed = True
+            self._ready.notify_all()
+
+# progressively shorter status lines for narrow terminals
+report_tighten = (('    ','  '), ('u',''), ('o',''), ('e',''), ('a',''), ('i',''))
+
 class BLE_Session(object):
     def __init__(self, message_queue=None):
         self.devices = {}
         self.messages = message_queue
         if self.messages is None:
-            self.messages = queue.Queue()
+            self.messages = MessageQueue()
+        # one event loop thread serves scan() and the connections
         self._thread = None
-        self._dbus_lock = asyncio.Lock()
-        self.running = threading.Lock()
-        self.running.acquire()
+        self._main = None
+        # BlueZ copes with a couple of connections being set up at once
+        self._dbus_sem = asyncio.Semaphore(2)
+        self._running = threading.Event()
+        self._running.set()
+        self._loop = None
+        self._stop_event = asyncio.Event()
         self.last_flush = datetime.datetime.utcnow()
         self.live_report = False
         self.live_count = defaultdict(int)
+        self._live_order = []  # sorted keys of live_count
+        self._last_report = 0
+        self._term_width = (0, 80)  # (checked at, columns)
         self.start_time = None
         self.last_messages = {}
         self.recycle = set()
     def is_running(self):
-        return self.running.locked()
+        return self._running.is_set()
+    def stop(self):
+        self._running.clear()
+        if isinstance(self.messages, MessageQueue):
+            self.messages.close()
+        if self._loop is None:
+            self._stop_event.set()
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        except RuntimeError:
+            # the BLE loop has already finished
+            pass
+    async def _sleep(self, seconds):
+        # wakes early when the session stops, True if stopped
+        if seconds > 0:
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), seconds)
+            except asyncio.TimeoutError:
+                pass
+        return not self.is_running()
     def register_device(self, address, notify_uuid, decode=None, callback=None, poll_msg=None, init_msg=None, stop_msg=None, alias=None, recycle=False):
         if decode is None:
             decode = lambda x: x
         if callback is None:
             callback = lambda s, d: self._message_callback(address, s, d)
-        self.devices[address] = {'uuid':notify_uuid, 'cb':callback, 'decode':decode, 'client':None, 'alias':alias, 'lastseen':0}
+        self.devices[address] = {'uuid':notify_uuid, 'cb':callback, 'decode':decode, 'client':None, 'alias':alias, 'lastseen':0, 'received':asyncio.Event()}
         if poll_msg:
             self.devices[address]['poll_msg'] = poll_msg
         if init_msg:
             self.devices[address]['init_msg'] = init_msg
         if stop_msg:
             self.devices[address]['stop_msg'] = stop_msg
-        if self.recycle:
+        if recycle:
             self.recycle.add(address)
     async def _poll_device(self, client, d):
-        poll = d['poll_msg']
-        delay_till = time.time() + poll['sleep']
+        # poll_msg is one message or a list of them, each on its own period
+        polls = d['poll_msg']
+        if isinstance(polls, dict):
+            polls = [polls]
+        # bleak wants a bytes-like payload, convert any lists once up front
+        polls = [(p['uuid'], bytes(p['payload']), p['sleep'], p.get('response', False)) for p in polls]
+        write = client.write_gatt_char
+        clock = time.time
+        start = clock()
+        delay_till = [start + sleep for uuid,payload,sleep,rep in polls]
         while self.is_running():
-            await asyncio.sleep(0.1)  # hard cap at 10/sec
-            waiting = delay_till - time.time()
-            if waiting > 0.1:
-                continue
-            if waiting > 0:
-                await asyncio.sleep(waiting)
+            # hard cap at 10/sec
+            if await self._sleep(max(min(delay_till) - clock(), 0.1)):
+                break
+            # anything due within half a tick goes out in this batch
+            now = clock() + 0.05
             # does this need a dbus_lock?
-            rep = 'response' in poll and poll['response']
-            await client.write_gatt_char(poll['uuid'], poll['payload'], response=rep)
-            delay_till += poll['sleep']
+            # acknowledged writes go one at a time, the rest are sent together
+            unacked = []
+            for i,t in enumerate(delay_till):
+                if t > now:
+                    continue
+                uuid, payload, sleep, rep = polls[i]
+                if rep:
+                    await write(uuid, payload, response=True)
+                else:
+                    unacked.append((uuid, payload))
+                delay_till[i] = t + sleep
+            if unacked:
+                # created late so a failed acknowledged write leaves nothing unawaited
+                await asyncio.gather(*(write(uuid, payload, response=False) for uuid,payload in unacked))
     async def _connect_to_device(self, address):
         d = self.devices[address]
-        await self._dbus_lock.acquire()
-        if not self.is_running():
-            self._dbus_lock.release()
-            return
-        try:
-            async with BleakClient(address, timeout=20) as client:
-                d['client'] = client
-                await client.start_notify(d['uuid'], d['cb'])
-                await asyncio.sleep(0.5)
-                self._dbus_lock.release()
-                if 'init_msg' in d:
-                    rep = 'response' in d['init_msg'] and d['init_msg']['response']
-                    await client.write_gatt_char(d['init_msg']['uuid'], d['init_msg']['payload'], response=rep)
-                    await asyncio.sleep(d['init_msg']['sleep'])
-                if 'poll_msg' in d:
-                    #await client.start_notify(d['poll_msg']['uuid'], d['cb'])
-                    await self._poll_device(client, d)
-                while self.is_running():
-                    await asyncio.sleep(0.1)
-                if 'stop_msg' in d:
-                    rep = 'response' in d['stop_msg'] and d['stop_msg']['response']
-                    await client.write_gatt_char(d['stop_msg']['uuid'], d['stop_msg']['payload'], response=rep)
-                    await asyncio.sleep(d['stop_msg']['sleep'])
-                await client.stop_notify(d['uuid'])
-        except bleak.exc.BleakError:
-            await self._messy_cleanup(address)
-        except asyncio.exceptions.TimeoutError:
-            if self._dbus_lock.locked():
-                self._dbus_lock.release()
-            if self.devices[address]['alias']:
-                print('TIMEOUT: "%s" retrying....' % self.devices[address]['alias'])
+        while self.is_running():
+            await self._dbus_sem.acquire()
+            connecting = True
+            try:
+                if not self.is_running():
+                    return
+                async with BleakClient(address, timeout=20) as client:
+                    d['client'] = client
+                    # only a packet from this connection ends the settle wait
+                    d['received'].clear()
+                    await client.start_notify(d['uuid'], d['cb'])
+                    # let the meter settle, the first packet ends the wait early
+                    try:
+                        await asyncio.wait_for(d['received'].wait(), 0.5)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._dbus_sem.release()
+                    connecting = False
+                    if 'init_msg' in d:
+                        rep = 'response' in d['init_msg'] and d['init_msg']['response']
+                        await client.write_gatt_char(d['init_msg']['uuid'], d['init_msg']['payload'], response=rep)
+                        await self._sleep(d['init_msg']['sleep'])
+                    if 'poll_msg' in d:
+                        #await client.start_notify(d['poll_msg']['uuid'], d['cb'])
+                        await self._poll_device(client, d)
+                    await self._stop_event.wait()
+                    if 'stop_msg' in d:
+                        rep = 'response' in d['stop_msg'] and d['stop_msg']['response']
+                        await client.write_gatt_char(d['stop_msg']['uuid'], d['stop_msg']['payload'], response=rep)
+                        await asyncio.sleep(d['stop_msg']['sleep'])
+                    await client.stop_notify(d['uuid'])
+                return
+            except bleak.exc.BleakError:
+                failed = True
+            except asyncio.exceptions.TimeoutError:
+                failed = False
+            finally:
+                if connecting:
+                    self._dbus_sem.release()
+            if failed:
+                await self._messy_cleanup(address)
+                return
+            if d['alias']:
+                print('TIMEOUT: "%s" retrying....' % d['alias'])
             else:
                 print('TIMEOUT:', address, 'retrying....')
-            await asyncio.sleep(5)
-            await self._connect_to_device(address)
+            await self._sleep(5)
     async def _messy_cleanup(self, address):
         d = self.devices[address]
-        if self._dbus_lock.locked():
-            self._dbus_lock.release()
         if self.is_running():
-            self.running.release()
+            self.stop()
             # disabled for fuzzing!
             if d['alias']:
                 print('ERROR: unable to connect to "%s"' % d['alias'], address)
@@ -844,59 +983,99 @@ class BLE_Session(object):
     async def _run(self):
         tasks = [self._connect_to_device(address) for address in self.devices]
         await asyncio.gather(*tasks)
-    def _async_launch(self):
+    def _loop_main(self, ready):
+        if uvloop:
+            loop = uvloop.new_event_loop()
+        else:
+            loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        ready.set()
         try:
-            asyncio.run(self._run())
-        except KeyboardInterrupt:
-            print('\nCleaning up connections.  Please wait....')
-            self.running.release()
+            loop.run_forever()
+        finally:
+            # unwind leftover connections like asyncio.run, so every client disconnects
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+    def _submit(self, coro):
+        if self._thread is None:
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._loop_main, args=(ready,), daemon=True)
+            self._thread.start()
+            ready.wait()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
     def start(self):
-        self._thread = threading.Thread(target=self._async_launch, daemon=True)
-        self._thread.start()
+        self._main = self._submit(self._run())
     def _message_callback(self, address, sender, data):
         #print(sender, len(data), data)
-        results = self.devices[address]['decode'](data)
+        d = self.devices[address]
+        results = d['decode'](data)
+        # one timestamp per notification, shared by all of its readings
+        timestamp = datetime.datetime.utcnow()
+        put = self.messages.put
         for r in results:
-            m = (datetime.datetime.utcnow(), address, r)
-            self.messages.put(m)
+            put((timestamp, address, r))
             self.reporting(address, r[2])
-            self.devices[address]['lastseen'] = m[0]
+        if self.live_report:
+            # once per notification so all of its readings are drawn
+            self._draw_report()
+        d['lastseen'] = time.monotonic()
+        d['received'].set()
     def message_iter(self):
         # will this drop a message if it is used multiple times?
         while self.is_running():
             try:
-                m = self.messages.get(timeout=0.05)
+                # wakes on the next message, the timeout only bounds shutdown
+                m = self.messages.get(timeout=0.25)
             except KeyboardInterrupt:
                 print('\nCleaning up connections.  Please wait....')
-                self.running.release()
+                self.stop()
                 continue
             except queue.Empty:
                 continue
             yield m
     def message_flush(self, drop=False, clear_count=True):
-        while not self.messages.empty():
-            try:
-                m = self.messages.get_nowait()
-                self.last_messages[m[1]] = m  # address:m
-                if not drop:
-                    yield m
-            except queue.Empty:
-                break
+        # drain first, recycled messages go back into the queue below
+        drained = []
+        get_nowait = self.messages.get_nowait
+        try:
+            while True:
+                drained.append(get_nowait())
+        except queue.Empty:
+            pass
+        for m in drained:
+            self.last_messages[m[1]] = m  # address:m
+            if not drop:
+                yield m
         self.last_flush = datetime.datetime.utcnow()
         if clear_count:
-            self.live_count = defaultdict(int)
+            self.live_count.clear()
+            self._live_order = []
         for address in self.recycle:
             if address in self.last_messages:
-                self.messages.put(last_messages[address])
+                self.messages.put(self.last_messages[address])
     def close(self):
-        if self.is_running():
-            self.running.release()
-        self._thread.join()
+        self.stop()
+        if self._thread is None:
+            return
+        try:
+            if self._main is not None:
+                self._main.result()
+        except Exception:
+            # report it like the BLE thread dying used to, without aborting the caller
+            traceback.print_exc()
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
     async def _scan(self):
         devices = await BleakScanner.discover(timeout=10)
         return devices
     def scan(self):
-        return asyncio.run(self._scan())
+        return self._submit(self._scan()).result()
     def wait_for_meters(self):
         waiting_for = set(self.devices)
         timeout = time.time() + 30
@@ -934,63 +1113,87 @@ class BLE_Session(object):
         name = self.devices[address]['alias']
         datum = '{} ({})'.format(name, units)
         self.live_count[datum] += 1
-        if self.live_report:
-            if self.start_time:
-                start = self.start_time
-            else:
-                start = self.last_flush
-            seconds = int((datetime.datetime.utcnow() - start).total_seconds())
-            report = '    '.join('{}: {}'.format(*kv) for kv in sorted(self.live_count.items()))
-            report = 'seconds: {}    '.format(seconds) + report
-            width = shutil.get_terminal_size()[0]
-            tighten = [('    ','  '), ('u',''), ('o',''), ('e',''), ('a',''), ('i',''), ]
-            for long,short in tighten:
-                if len(report) < width:
-                    break
-                report = report.replace(long, short)
-            print('\r' + report + ' '*(width - len(report)), end='')
+    def _draw_report(self):
+        # redrawing the status line faster than 10 Hz only burns cpu
+        now = time.monotonic()
+        if now - self._last_report < 0.1:
+            return
+        self._last_report = now
+        if now - self._term_width[0] > 1:
+            self._term_width = (now, shutil.get_terminal_size()[0])
+        width = self._term_width[1]
+        if self.start_time:
+            start = self.start_time
+        else:
+            start = self.last_flush
+        seconds = int((datetime.datetime.utcnow() - start).total_seconds())
+        live_count = self.live_count
+        if len(self._live_order) != len(live_count):
+            # only re-sort when a new reading shows up
+            self._live_order = sorted(live_count)
+        # get() because message_flush may clear the counts from the main thread
+        report = '    '.join('{}: {}'.format(k, live_count.get(k, 0)) for k in self._live_order)
+        report = 'seconds: {}    '.format(seconds) + report
+        for long,short in report_tighten:
+            if len(report) < width:
+                break
+            report = report.replace(long, short)
+        print('\r' + report + ' '*(width - len(report)), end='')
+
+decoder_table = {
+    'TS04': TS04_Decoder,
+    '90EPD': HP90EPD_Decoder,
+    'HP90EPD': HP90EPD_Decoder,
+    'AN9002': AN9002_Decoder,
+    'ZT300AB': AN9002_Decoder,
+    'V05B': V05B_Decoder,
+    'ZT5B': V05B_Decoder,
+    'WT81B': WT81B_Decoder,
+    'UT383BT': UT383BT_Decoder,
+    'TP357': TP357_Decoder,
+    'TS02': TS02_Decoder,
+    'K1705': K1705_Decoder,
+    'BT980D': BT980D_Decoder,
+    'BT7200_APP': BT7200_APP_Decoder,
+    'BT985C_APP': BT985C_APP_Decoder,
+    'dummy': Dummy_Decoder,
+}
 
 def make_decoder(model):
-    return {
-        'TS04': TS04_Decoder,
-        '90EPD': HP90EPD_Decoder,
-        'AN9002': AN9002_Decoder,
-        'ZT300AB': AN9002_Decoder,
-        'V05B': V05B_Decoder,
-        'ZT5B': V05B_Decoder,
-        'WT81B': WT81B_Decoder,
-        'UT383BT': UT383BT_Decoder,
-        'TP357': TP357_Decoder,
-        'TS02': TS02_Decoder,
-        'K1705': K1705_Decoder,
-        'BT980D': BT980D_Decoder,
-        'BT7200_APP': BT7200_APP_Decoder,
-        'BT985C_APP': BT985C_APP_Decoder,
-        'dummy': Dummy_Decoder,
-    }[model]()
+    return decoder_table[model]()
 
 def find_meters(devices):
-    address_check = True
+    # index the known devices by exact name, only wildcards need a scan
+    exact = defaultdict(list)
+    wildcards = []
+    for i,known in enumerate(known_devices):
+        if known['name'].endswith('*'):
+            wildcards.append((known['name'][:-1], i, known))
+        else:
+            exact[known['name']].append((i, known))
+    candidates = []
+    for d in devices:
+        name = d.name or ''
+        matches = list(exact.get(name, ()))
+        matches.extend((i, known) for prefix,i,known in wildcards if name.startswith(prefix))
+        if matches:
+            # keep the order of known_devices
+            matches.sort(key=lambda m: m[0])
+            candidates.append((d, [known for i,known in matches]))
     found = set()
-    for _ in range(2):
-        for d in devices:
-            for known in known_devices:
+    # OSX uses unpredictable UUIDs instead of MACs, so retry without the address
+    for address_check in (True, False):
+        for d,matches in candidates:
+            if d in found:
+                continue
+            for known in matches:
                 if address_check and not d.address.startswith(known['prefix']):
                     continue
-                if known['name'].endswith('*'):
-                    if not d.name.startswith(known['name'][:-1]):
-                        continue
-                elif d.name != known['name']:
-                    continue
-                if d in found:
-                    continue
                 # something to check the notify uuid?
                 # work around pointless use of __slots__
-                d2 = Device(d, make_decoder(known['decoder']), known['decoder'])
-                yield d2
+                yield Device(d, make_decoder(known['decoder']), known['decoder'])
                 found.add(d)
-        # OSX uses unpredictable UUIDs instead of MACs
-        address_check = False
+                break
 
 def meter_autoregister():
     print('Attempting to auto-detect meters....')
@@ -1000,6 +1203,8 @@ def meter_autoregister():
         session.register_device(a.d.address, a.decoder.notify_uuid, decode=a.decoder.decode, poll_msg=a.decoder.poll_msg, init_msg=a.decoder.init_msg, stop_msg=a.decoder.stop_msg)
         session.devices[a.d.address]['model'] = a.model
 
+duration_re = re.compile(r'[0-9.]+')
+
 def load_ini(path):
     config = configparser.ConfigParser(interpolation=None)
     config.read(path)
@@ -1007,7 +1212,7 @@ def load_ini(path):
         d = config['DEFAULT']['duration'].lower().strip()
         if d == 'manual':
             return config
-        n = float(re.match('[0123456789\.]+', d).group(0))
+        n = float(duration_re.match(d).group(0))
         if 'minute' in d:
             n *= 60
         config['DEFAULT']['duration'] = str(n)
@@ -1040,6 +1245,7 @@ def statistics(messages, start_time, stop_time):
     if not columns:
         return []
     for name,values in columns.items():
+        # sorted once, so the extremes and quartiles are just indexes
         values = sorted(n for t,n in values)
         if len(values) == 0:
             continue
@@ -1048,12 +1254,12 @@ def statistics(messages, start_time, stop_time):
             'duration': (stop_time - start_time).total_seconds(),
             'address': name[0], 'unit': name[1],
             'mean': m, 'samples': len(values),
-            'deviation': math.sqrt(mean([(v - m)**2 for v in values])),
-            'minimum': min(values),
+            'deviation': math.sqrt(sum((v - m)**2 for v in values) / len(values)),
+            'minimum': values[0],
             'quartile1': values[int(round(len(values) * 0.25))],
             'median': values[len(values)//2],
             'quartile3': values[min(int(round(len(values) * 0.75)), len(values)-1)],
-            'maximum': max(values)}
+            'maximum': values[-1]}
         if stats['minimum'] == stats['maximum']:
             stats['deviation'] = 0
         yield stats
@@ -1068,24 +1274,30 @@ def manual_wait():
     print()
 
 def simple_columns(path, conf):
-    simple = defaultdict(dict)
+    dialect = conf['DEFAULT']['Dialect']
+    # first pass only learns the columns
     header = set()
     with open(path, newline='') as csvfile:
-        reader = csv.DictReader(csvfile, dialect=conf['DEFAULT']['Dialect'])
-        for row in reader:
-            ts = row['timestamp']
-            simple[ts]['timestamp'] = ts
-            head = '{} ({})'.format(row['name'], row['unit'])
-            header.add(head)
-            simple[ts][head] = row['mean']
-    header = ['timestamp'] + sorted(list(header))
+        for row in csv.DictReader(csvfile, dialect=dialect):
+            header.add('{} ({})'.format(row['name'], row['unit']))
+    header = ['timestamp'] + sorted(header)
     simple_path = [os.path.dirname(path), 'simple ' + os.path.basename(path)]
     simple_path = os.path.join(*simple_path)
-    with open(simple_path, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=header, dialect=conf['DEFAULT']['Dialect'], extrasaction='ignore')
+    # every row of a summary shares its timestamp and they are written in order,
+    # so only the current line needs to be held
+    with open(path, newline='') as csvfile, open(simple_path, 'w', newline='') as simplefile:
+        writer = csv.DictWriter(simplefile, fieldnames=header, dialect=dialect, extrasaction='ignore')
         writer.writeheader()
-        for ts,row in sorted(simple.items()):
-            writer.writerow(row)
+        line = None
+        for row in csv.DictReader(csvfile, dialect=dialect):
+            ts = row['timestamp']
+            if line is None or line['timestamp'] != ts:
+                if line is not None:
+                    writer.writerow(line)
+                line = {'timestamp': ts}
+            line['{} ({})'.format(row['name'], row['unit'])] = row['mean']
+        if line is not None:
+            writer.writerow(line)
 
 def brute_force():
     # this is for devs so none of it is made easy to use
@@ -1099,7 +1311,7 @@ def brute_force():
             for _ in range(10):
                 session = BLE_Session()
                 d = decoder()
-                d.poll_msg = {'uuid': "0000{0:x}-0000-1000-8000-00805f9b34fb".format(0xffe3), 'payload': [i, j], 'sleep':1.0, 'response':True}
+                d.poll_msg = {'uuid': ble_uuid(0xffe3), 'payload': bytes((i, j)), 'sleep':1.0, 'response':True}
                 session.register_device(address, d.notify_uuid, decode=d.decode, poll_msg=d.poll_msg, init_msg=d.init_msg, stop_msg=d.stop_msg)
                 session.start()
                 rx_count = 0
@@ -1166,7 +1378,8 @@ def main(args):
 
     # put off creating the file as long as possible to make it startup failures less annoying
     if args.output:
-        logging_fh = open(args.output, 'wt')
+        # csv does its own line endings, rows are flushed in batches
+        logging_fh = open(args.output, 'wt', newline='', buffering=1<<16)
     if args.config:
         fields = conf['DEFAULT']['Columns'].split()
         logging_csv = csv.DictWriter(logging_fh, dialect=conf['DEFAULT']['Dialect'], fieldnames=fields, extrasaction='ignore')
@@ -1174,6 +1387,22 @@ def main(args):
         fields = ['timestamp', 'model', 'address', 'value', 'unit']
         logging_csv = csv.DictWriter(logging_fh, dialect='excel-tab', fieldnames=fields, extrasaction='ignore')
 
+    # flushing every row costs a syscall per packet, so batch them
+    unflushed = 0
+    flushed_at = time.monotonic()
+    def flush_rows():
+        nonlocal unflushed, flushed_at
+        unflushed += 1
+        now = time.monotonic()
+        if unflushed >= 32 or now - flushed_at > 0.5:
+            logging_fh.flush()
+            unflushed = 0
+            flushed_at = now
+
+    # readings from one notification share a timestamp, format it once
+    last_timestamp = None
+    timestamp_str = ''
+
     # needs a big refactoring
     try:
         if args.output:
@@ -1192,12 +1421,14 @@ def main(args):
                 if auto_warning and 'auto_off' in lcd:
                     print('WARNING: Automatic power off is enabled')
                     auto_warning = False
-                if type(n) == float:
+                if isinstance(n, float):
                     n = format(n, '.4g')
+                if timestamp is not last_timestamp:
+                    last_timestamp, timestamp_str = timestamp, str(timestamp)
                 model = session.devices[address]['model']
-                row = {'timestamp':str(timestamp), 'address':address, 'value':str(n), 'unit':units, 'model':model}
+                row = {'timestamp':timestamp_str, 'address':address, 'value':str(n), 'unit':units, 'model':model}
                 logging_csv.writerow(row)
-                logging_fh.flush()
+                flush_rows()
         else:
             if conf['DEFAULT']['mode'] == 'live':
                 for m in session.message_iter():
@@ -1208,13 +1439,15 @@ def main(args):
                     if auto_warning and 'auto_off' in lcd:
                         print('WARNING: Automatic power off is enabled')
                         auto_warning = False
-                    if type(n) == float:
+                    if isinstance(n, float):
                         n = format(n, '.4g')
                     alias = session.devices[address]['alias']
+                    if timestamp is not last_timestamp:
+                        last_timestamp, timestamp_str = timestamp, str(timestamp)
                     model = session.devices[address]['model']
-                    row = {'timestamp':str(timestamp), 'address':address, 'value':str(n), 'unit':units, 'name':alias, 'model':model}
+                    row = {'timestamp':timestamp_str, 'address':address, 'value':str(n), 'unit':units, 'name':alias, 'model':model}
                     logging_csv.writerow(row)
-                    logging_fh.flush()
+                    flush_rows()
             if conf['DEFAULT']['mode'] == 'summary':
                 if conf['DEFAULT']['duration'] == 'manual':
                     wait_fn = manual_wait
@@ -1233,7 +1466,7 @@ def main(args):
                         stats['model'] = session.devices[stats['address']]['model']
                         stats['duration'] = (stop_time - start_time).total_seconds()
                         for k,n in stats.items():
-                            if type(n) == float:
+                            if isinstance(n, float):
                                 stats[k] = format(n, '.4g')
                         logging_csv.writerow(stats)
                         logging_fh.flush()
@@ -1268,7 +1501,9 @@ def main(args):
         print('\nCleaning up connections.  Please wait....')
         pass
     session.live_report = False
+    logging_fh.flush()
     if args.output:
+        os.fsync(logging_fh.fileno())
         logging_fh.close()
     try:
         if args.output and conf['DEFAULT']['Mode'] == 'summary':